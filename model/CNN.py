@@ -1,5 +1,7 @@
 import os
 import argparse
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
 import numpy as np
 import tensorflow as tf
 from tensorflow.keras.utils import to_categorical
@@ -25,23 +27,35 @@ BATCH_SIZE = 128
 SAMPLES_PER_CLASS = 9000
 TEST_ENABLED = True  # Set to False to skip visualizations for faster execution
 TEST_SAMPLES_PER_CLASS = 1000  # number of samples per class reserved for testing (tail of each file)
+EXPORT_BUFFER_SIZE = 1 << 20  # 1 MiB write buffer for COE/VHDL exports
+
+# Two-character uppercase hex for every byte value, indexed by (value & 0xFF)
+_INT8_HEX = tuple(f"{i:02X}" for i in range(256))
+
+@lru_cache(maxsize=None)
+def list_categories(folder):
+    """Return the category names (.npy file stems) in folder, sorted for deterministic indices."""
+    return tuple(sorted(os.path.splitext(file)[0] for file in os.listdir(folder) if file.endswith(".npy")))
 
 def load_data():
     """Load and preprocess data from training folder."""
     print("Loading data...")
     
-    # Dynamically load categories from the training_data folder (sorted for deterministic indices)
-    categories = sorted([os.path.splitext(file)[0] for file in os.listdir(TRAINING_DATA_FOLDER) if file.endswith(".npy")])
+    # Dynamically load categories from the training_data folder (listing is cached per folder)
+    categories = list(list_categories(TRAINING_DATA_FOLDER))
     print(f"Categories loaded: {categories}")
     
-    data = []
-    labels = []
+    def load_category(category):
+        # Load training + reserved test samples so we can use the tail for evaluation without retraining.
+        # Memory-map the file so only the kept slice is read, and copy it here so the read
+        # happens on the worker thread.
+        drawings = np.load(f'{TRAINING_DATA_FOLDER}/{category}.npy', mmap_mode='r')
+        return np.array(drawings[:(SAMPLES_PER_CLASS + TEST_SAMPLES_PER_CLASS)])
     
-    for i, category in enumerate(categories):
-        # Load training + reserved test samples so we can use the tail for evaluation without retraining
-        drawings = np.load(f'{TRAINING_DATA_FOLDER}/{category}.npy')[:(SAMPLES_PER_CLASS + TEST_SAMPLES_PER_CLASS)]
-        data.append(drawings)
-        labels.append(np.full(drawings.shape[0], i))
+    # Class files are independent, so overlap their disk reads
+    with ThreadPoolExecutor(max_workers=max(1, min(8, len(categories)))) as executor:
+        data = list(executor.map(load_category, categories))
+    labels = [np.full(drawings.shape[0], i) for i, drawings in enumerate(data)]
     
     x = np.concatenate(data)
     y = np.concatenate(labels)
@@ -114,6 +128,11 @@ def capture_intermediate_values(model, x_sample, categories):
                 test_image[i, j] = (i + j + 1) % 256  # Matches VHDL: (row + col + 1) mod 256
         return test_image
     
+    def format_region(values, width, indent):
+        """Format the top-left 5x5 region of a 2D array as one printable block"""
+        return "\n".join(indent + "".join(f"{v:{width}.3f} " for v in row)
+                         for row in values[:5, :5].tolist())
+    
     # Use the same test pattern as VHDL instead of training data
     test_image = create_test_image_28x28()
     
@@ -126,16 +145,12 @@ def capture_intermediate_values(model, x_sample, categories):
     # Create a model that outputs intermediate values
     layer_outputs = [layer.output for layer in model.layers]
     intermediate_model = tf.keras.Model(inputs=model.input, outputs=layer_outputs)
-    intermediate_outputs = intermediate_model.predict(sample_input)
+    # Single sample: call the model directly instead of going through predict()
+    intermediate_outputs = [out.numpy() for out in intermediate_model(sample_input, training=False)]
     
     print(f"Input shape: {sample_input.shape}")
     print(f"Input pixel values (first 5x5 region):")
-    input_2d = sample_input[0, :, :, 0]
-    for i in range(min(5, input_2d.shape[0])):
-        row_str = ""
-        for j in range(min(5, input_2d.shape[1])):
-            row_str += f"{input_2d[i,j]:6.3f} "
-        print(f"  {row_str}")
+    print(format_region(sample_input[0, :, :, 0], 6, "  "))
     
     # Save intermediate values
     intermediate_data = {}
@@ -151,12 +166,7 @@ def capture_intermediate_values(model, x_sample, categories):
                 filter_output = output[0, :, :, filter_idx]
                 # Only print first 3 for readability
                 if filter_idx < 3:
-                    print(f"  Filter {filter_idx} output (5x5 region):")
-                    for row in range(min(5, filter_output.shape[0])):
-                        row_str = ""
-                        for col in range(min(5, filter_output.shape[1])):
-                            row_str += f"{filter_output[row,col]:8.3f} "
-                        print(f"    {row_str}")
+                    print(f"  Filter {filter_idx} output (5x5 region):\n{format_region(filter_output, 8, '    ')}")
                 
                 # Save complete filter output for ALL filters
                 intermediate_data[f"layer_{i}_filter_{filter_idx}"] = filter_output
@@ -167,12 +177,7 @@ def capture_intermediate_values(model, x_sample, categories):
             print(f"  MaxPooling2D pool_size: {layer.pool_size}")
             # Show first filter after pooling
             pooled_output = output[0, :, :, 0]
-            print(f"  Pooled output (first filter, 5x5 region):")
-            for row in range(min(5, pooled_output.shape[0])):
-                row_str = ""
-                for col in range(min(5, pooled_output.shape[1])):
-                    row_str += f"{pooled_output[row,col]:8.3f} "
-                print(f"    {row_str}")
+            print(f"  Pooled output (first filter, 5x5 region):\n{format_region(pooled_output, 8, '    ')}")
         
         elif isinstance(layer, tf.keras.layers.Flatten):
             print(f"  Flattened to: {output.shape[1]} values")
@@ -186,7 +191,7 @@ def capture_intermediate_values(model, x_sample, categories):
         intermediate_data[f"layer_{i}_output"] = output[0]
     
     # Save intermediate data to files
-    np.savez('model/intermediate_values.npz', **intermediate_data)
+    np.savez_compressed('model/intermediate_values.npz', **intermediate_data)
     print(f"\nOK: Intermediate values saved to 'model/intermediate_values.npz'")
     
     return intermediate_data
@@ -323,21 +328,17 @@ def create_test_dataset_for_quantization(x, categories):
     """Create a small test dataset for quantization validation."""
     # Use up to 1000 samples per class from the reserved tail for quantization tests
     test_samples_per_class = min(TEST_SAMPLES_PER_CLASS, 1000)
-    test_samples = test_samples_per_class * len(categories)
-    x_test_quant = []
-    y_test_quant = []
-    
-    for i in range(len(categories)):
-        # Region for this class in the loaded x: (i * (SAMPLES_PER_CLASS+TEST_SAMPLES_PER_CLASS)) ..
-        class_region_start = i * (SAMPLES_PER_CLASS + TEST_SAMPLES_PER_CLASS)
-        class_region_end = class_region_start + SAMPLES_PER_CLASS + TEST_SAMPLES_PER_CLASS
-        # Take last `test_samples_per_class` for this class
-        start_idx = max(class_region_start + SAMPLES_PER_CLASS, class_region_end - test_samples_per_class)
-        end_idx = start_idx + test_samples_per_class
-        x_test_quant.extend(x[start_idx:end_idx])
-        y_test_quant.extend([i] * (end_idx - start_idx))
-    
-    return np.array(x_test_quant[:test_samples]), np.array(y_test_quant[:test_samples])
+    class_region = SAMPLES_PER_CLASS + TEST_SAMPLES_PER_CLASS
+
+    # Region for class i in the loaded x is [i * class_region, (i + 1) * class_region);
+    # take the last `test_samples_per_class` of each region with a single gather
+    starts = np.arange(len(categories)) * class_region + class_region - test_samples_per_class
+    indices = (starts[:, None] + np.arange(test_samples_per_class)).ravel()
+    labels = np.repeat(np.arange(len(categories)), test_samples_per_class)
+
+    # Drop indices past the end of x (classes with fewer samples than requested)
+    in_range = indices < len(x)
+    return x[indices[in_range]], labels[in_range]
 
 def quantize_model_post_training(x):
     """Apply post-training quantization."""
@@ -421,47 +422,74 @@ def apply_manual_quantization(model, x_test_quant, y_test_quant):
     
     print("Applying Q1.6 quantization simulation (matching FPGA export)...")
     
-    manual_quant_model = tf.keras.models.clone_model(model)
-    manual_quant_model.set_weights(model.get_weights())
-    
-    # Simulate Q1.6 quantization (same as FPGA export)
+    # Quantize the trained model in place instead of cloning it (a clone rebuilds
+    # the whole graph); the original float weights are restored afterwards
+    original_weights = model.get_weights()
+
+    # Simulate Q1.6 quantization (same as FPGA export): scale to int8, clamp, round,
+    # scale back - all in one float32 scratch buffer per tensor
     quantized_weights = []
-    for layer_weights in manual_quant_model.get_weights():
-        # Clamp to Q1.6 range
-        clamped = np.clip(layer_weights, min_value, max_value)
-        # Quantize: scale to int8, then scale back
-        quantized_int = np.round(clamped * scale_factor)
-        quantized = quantized_int / scale_factor
-        quantized_weights.append(quantized.astype(np.float32))
-    
-    manual_quant_model.set_weights(quantized_weights)
-    
-    # Test manual quantized model
-    manual_predictions = manual_quant_model.predict(x_test_quant[:50])
-    manual_accuracy = np.mean(np.argmax(manual_predictions, axis=1) == y_test_quant[:50])
-    print(f"OK: Manual quantization simulation accuracy: {manual_accuracy:.3f}")
-    
-    # Convert manual quantized model
-    converter_manual = tf.lite.TFLiteConverter.from_keras_model(manual_quant_model)
-    converter_manual.optimizations = [tf.lite.Optimize.DEFAULT]
-    quantized_manual_model = converter_manual.convert()
+    for layer_weights in original_weights:
+        quantized = np.multiply(layer_weights, scale_factor, dtype=np.float32)
+        np.clip(quantized, min_value * scale_factor, max_value * scale_factor, out=quantized)
+        np.rint(quantized, out=quantized)
+        quantized /= scale_factor
+        quantized_weights.append(quantized)
+
+    model.set_weights(quantized_weights)
+    try:
+        # Test manual quantized model
+        # Direct call: one batch of 50 does not need predict()'s batching/callback loop
+        manual_predictions = model(x_test_quant[:50], training=False).numpy()
+        manual_accuracy = np.mean(np.argmax(manual_predictions, axis=1) == y_test_quant[:50])
+        print(f"OK: Manual quantization simulation accuracy: {manual_accuracy:.3f}")
+
+        # Convert manual quantized model
+        converter_manual = tf.lite.TFLiteConverter.from_keras_model(model)
+        converter_manual.optimizations = [tf.lite.Optimize.DEFAULT]
+        quantized_manual_model = converter_manual.convert()
+    finally:
+        model.set_weights(original_weights)
     
     with open('model/quantized_manual_model.tflite', 'wb') as f:
         f.write(quantized_manual_model)
     
     print("OK: Manual quantized model saved as 'model/quantized_manual_model.tflite'")
 
-def convert_to_onnx():
-    """Convert SavedModel to ONNX format (optional for FPGA development)."""
+def convert_to_onnx(model=None):
+    """Convert the model to ONNX format (optional for FPGA development).
+
+    When the in-memory Keras model is given, tf2onnx runs in this process and reuses
+    the already-loaded TensorFlow runtime. Otherwise (or if tf2onnx cannot be imported
+    here, or the in-process conversion fails) the SavedModel is converted by the tf2onnx
+    CLI in a separate interpreter.
+    """
+    onnx_path = "model/quickdraw_model.onnx"
+    if model is not None:
+        try:
+            import tf2onnx
+        except ImportError:
+            tf2onnx = None
+        if tf2onnx is not None:
+            try:
+                # Keep the model's own input name so the ONNX interface matches the CLI path
+                input_name = model.inputs[0].name.split(":")[0]
+                input_signature = (tf.TensorSpec((None, 28, 28, 1), tf.float32, name=input_name),)
+                tf2onnx.convert.from_keras(model, input_signature=input_signature, output_path=onnx_path)
+                print(f"OK: Model successfully converted to ONNX format: {onnx_path}")
+                return
+            except Exception as e:
+                print(f"INFO: In-process ONNX conversion failed, trying tf2onnx CLI: {e}")
+
     import sys
     python_path = sys.executable
     try:
         result = subprocess.run([
             python_path, "-m", "tf2onnx.convert",
             "--saved-model", "model/saved_model",
-            "--output", "model/quickdraw_model.onnx"
+            "--output", onnx_path
         ], capture_output=True, text=True, check=True)
-        print("OK: Model successfully converted to ONNX format: model/quickdraw_model.onnx")
+        print(f"OK: Model successfully converted to ONNX format: {onnx_path}")
     except (subprocess.CalledProcessError, FileNotFoundError):
         print("INFO: ONNX conversion skipped (optional for FPGA development)")
 
@@ -483,23 +511,26 @@ def export_to_FPGA(model, q_format="Q1.6"):
     
     def quantize_to_q1_6(value):
         """Convert floating point value to Q1.6 format"""
-        # Clamp to valid range
-        clamped = np.clip(value, min_value, max_value)
-        # Scale and round to nearest integer
-        quantized_int = np.round(clamped * scale_factor).astype(np.int8)
-        return quantized_int
-    
-    def int8_to_hex(value):
-        """Convert signed int8 to 2-character hex string"""
-        # Ensure we operate on Python ints (handle numpy types)
-        try:
-            iv = int(value)
-        except Exception:
-            iv = 0
-        if iv < 0:
-            return f"{(256 + iv) & 0xFF:02X}"
-        else:
-            return f"{iv & 0xFF:02X}"
+        # Scale, clamp to the int8 range and round in place (one scratch buffer)
+        scaled = np.multiply(value, scale_factor, dtype=np.float32)
+        np.clip(scaled, min_value * scale_factor, max_value * scale_factor, out=scaled)
+        np.rint(scaled, out=scaled)
+        return scaled.astype(np.int8)
+    
+    def int8_to_hex(values):
+        """Convert an array of signed int8 values to 2-character hex strings"""
+        # Viewing as uint8 maps negative values onto their two's complement byte
+        return [_INT8_HEX[b] for b in np.asarray(values, dtype=np.int8).view(np.uint8).tolist()]
+    
+    def format_coe_vector(words, words_per_line):
+        """Join hex words into a COE vector: comma separated, ';' terminated, wrapped
+        every `words_per_line` words with continuation lines starting with ','"""
+        lines = [",".join(words[k:k + words_per_line]) for k in range(0, len(words), words_per_line)]
+        vector = "\n,".join(lines) + ";"
+        # Final newline only if the last line is partial
+        if len(words) % words_per_line != 0:
+            vector += "\n"
+        return vector
     
     # Create output directory
     output_dir = "model/fpga_weights_and_bias"
@@ -509,6 +540,8 @@ def export_to_FPGA(model, q_format="Q1.6"):
     total_params = 0
     # Collect quantized biases per layer to emit a single VHDL package
     bias_collections = {}
+    # Collect every quantized int8 tensor (original shape) for the compressed bundle
+    weight_bundle = {}
     
     # Process each layer
     for i, layer in enumerate(model.layers):
@@ -536,7 +569,7 @@ def export_to_FPGA(model, q_format="Q1.6"):
                 
                 # Save as COE file for Vivado (proper format)
                 weights_filename = f"{output_dir}/layer_{i}_{layer.name}_weights.coe"
-                with open(weights_filename, 'w') as f:
+                with open(weights_filename, 'w', buffering=EXPORT_BUFFER_SIZE, newline='\n', encoding='utf-8') as f:
                     # COE file header with proper format
                     f.write(f"; Layer {i}: {layer.name} weights ({q_format} format)\n")
                     f.write(f"; Original shape: {weights.shape}\n")
@@ -559,96 +592,25 @@ def export_to_FPGA(model, q_format="Q1.6"):
                     f.write(f"memory_initialization_radix=16; Hexadecimal format\n")
                     f.write(f"memory_initialization_vector=")
                     
-                    # Pack weights for Conv2D layers
-                    if len(weights.shape) == 4:  # Conv2D
-                        kernel_h, kernel_w, in_channels, num_filters = weights.shape
-                        depth = kernel_h * kernel_w * in_channels
-                        
-                        # Reshape: (K_H, K_W, C_in, N_filters) -> pack by kernel position and channel
-                        # For each combination of (kernel_h, kernel_w, channel), pack all filters together
-                        for addr in range(depth):
-                            # Calculate position in 3D space (kh, kw, c_in)
-                            kh = addr // (kernel_w * in_channels)
-                            kw = (addr // in_channels) % kernel_w
-                            c_in = addr % in_channels
-                            
-                            # Pack all num_filters weights at this (kh, kw, c_in) position into one wide word
-                            packed_value = 0
-                            for f_idx in range(num_filters):
-                                # Calculate correct index in flattened array
-                                # TensorFlow weight shape: (kernel_h, kernel_w, in_channels, num_filters)
-                                weight_idx = ((kh * kernel_w + kw) * in_channels + c_in) * num_filters + f_idx
-                                qw = quantized_weights[weight_idx]
-                                byte_value = int(qw) & 0xFF
-                                # Pack MSB-first so that filter 0 occupies the most significant byte
-                                # This matches the VHDL BRAM unpacking convention (MSB-first)
-                                packed_value |= (byte_value << ((num_filters - 1 - f_idx) * 8))
-                            
-                            # Write packed value
-                            num_hex_chars = (num_filters * 8 + 3) // 4
-                            if addr == 0:
-                                f.write(f"{packed_value:0{num_hex_chars}X}")
-                            elif addr == depth - 1:
-                                f.write(f",{packed_value:0{num_hex_chars}X};")
-                            else:
-                                f.write(f",{packed_value:0{num_hex_chars}X}")
-                            
-                            # Add newline for readability
-                            if (addr + 1) % 4 == 0 and addr != depth - 1:
-                                f.write("\n")
+                    if len(weights.shape) in (4, 2):
+                        # Packed layers: one address per row of the (addresses, nodes) table.
+                        # Conv2D (K_H, K_W, C_in, N_filters) rows are (kh, kw, c_in) positions in
+                        # row-major order; Dense (num_inputs, num_outputs) rows are inputs.
+                        word_chars = weights.shape[-1] * 2
+                        # Each row's int8 bytes are MSB-first: filter/output 0 occupies the most
+                        # significant byte, matching the VHDL BRAM unpacking convention
+                        packed_hex = quantized_weights.tobytes().hex().upper()
+                        words = [packed_hex[k:k + word_chars] for k in range(0, len(packed_hex), word_chars)]
                         
-                        if depth % 4 != 0:
-                            f.write("\n")
-                    elif len(weights.shape) == 2:  # Dense: (num_inputs, num_outputs)
-                        num_inputs, num_outputs = weights.shape
-                        depth = num_inputs
-                        
-                        # Pack weights: for each input, pack all output node weights together
-                        # TensorFlow Dense weight shape: (num_inputs, num_outputs)
-                        for input_idx in range(depth):
-                            # Pack all num_outputs weights for this input into one wide word
-                            packed_value = 0
-                            for output_idx in range(num_outputs):
-                                # Calculate correct index in flattened array
-                                weight_idx = input_idx * num_outputs + output_idx
-                                qw = quantized_weights[weight_idx]
-                                byte_value = int(qw) & 0xFF
-                                # Pack MSB-first to match VHDL unpacking: output 0 → MSB, output N-1 → LSB
-                                packed_value |= (byte_value << ((num_outputs - 1 - output_idx) * 8))
-                            
-                            # Write packed value (same format as Conv2D for consistency)
-                            num_hex_chars = (num_outputs * 8 + 3) // 4
-                            if input_idx == 0:
-                                f.write(f"{packed_value:0{num_hex_chars}X}")
-                            elif input_idx == depth - 1:
-                                f.write(f",{packed_value:0{num_hex_chars}X};")
-                            else:
-                                f.write(f",{packed_value:0{num_hex_chars}X}")
-                            
-                            # Add newline for readability every 4 addresses
-                            if (input_idx + 1) % 4 == 0 and input_idx != depth - 1:
-                                f.write("\n")
-                        
-                        if depth % 4 != 0:
-                            f.write("\n")
+                        # 4 packed words per line for readability
+                        f.write(format_coe_vector(words, 4))
                     else:
-                        # Other layers: write individual values (unpacked)
-                        for j, qw in enumerate(quantized_weights):
-                            if j == 0:
-                                f.write(f"{int8_to_hex(qw)}")
-                            elif j == len(quantized_weights) - 1:
-                                f.write(f",{int8_to_hex(qw)};")
-                            else:
-                                f.write(f",{int8_to_hex(qw)}")
-                            
-                            if (j + 1) % 16 == 0 and j != len(quantized_weights) - 1:
-                                f.write("\n")
-                        
-                        if len(quantized_weights) % 16 != 0:
-                            f.write("\n")
+                        # Other layers: write individual values (unpacked), 16 per line
+                        f.write(format_coe_vector(int8_to_hex(quantized_weights), 16))
                 
                 print(f"  OK: Weights saved to: {weights_filename}")
                 total_params += len(quantized_weights)
+                weight_bundle[f"layer_{i}_{layer.name}_weights"] = quantized_weights.reshape(weights.shape)
             
             # Process biases (second element, if exists)
             if len(weights_and_biases) > 1:
@@ -666,7 +628,7 @@ def export_to_FPGA(model, q_format="Q1.6"):
                 
                 # Save as COE file for Vivado (proper format)
                 biases_filename = f"{output_dir}/layer_{i}_{layer.name}_biases.coe"
-                with open(biases_filename, 'w') as f:
+                with open(biases_filename, 'w', buffering=EXPORT_BUFFER_SIZE, newline='\n', encoding='utf-8') as f:
                     # COE file header with proper format
                     f.write(f"; Layer {i}: {layer.name} biases ({q_format} format)\n")
                     f.write(f"; Shape: {biases.shape}\n")
@@ -679,25 +641,12 @@ def export_to_FPGA(model, q_format="Q1.6"):
                     f.write(f"memory_initialization_radix=16; Hexadecimal format\n")
                     f.write(f"memory_initialization_vector=")
                     
-                    # Write individual bias values (unpacked format)
-                    for j, qb in enumerate(quantized_biases):
-                        if j == 0:
-                            f.write(f"{int8_to_hex(qb)}")
-                        elif j == len(quantized_biases) - 1:
-                            f.write(f",{int8_to_hex(qb)};")
-                        else:
-                            f.write(f",{int8_to_hex(qb)}")
-                        
-                        # Add newline every 16 values for readability
-                        if (j + 1) % 16 == 0 and j != len(quantized_biases) - 1:
-                            f.write("\n")
-                    
-                    # Final newline if not already added
-                    if len(quantized_biases) % 16 != 0:
-                        f.write("\n")
+                    # Write individual bias values (unpacked format), 16 per line for readability
+                    f.write(format_coe_vector(int8_to_hex(quantized_biases), 16))
                 
                 print(f"  OK: Biases saved to: {biases_filename}")
                 total_params += len(quantized_biases)
+                weight_bundle[f"layer_{i}_{layer.name}_biases"] = quantized_biases
                 # Store quantized biases for package emission later
                 if len(quantized_biases.shape) == 1 or isinstance(quantized_biases, (list, np.ndarray)):
                     key = f"layer_{i}_{layer.name}"
@@ -706,9 +655,14 @@ def export_to_FPGA(model, q_format="Q1.6"):
             
             layer_count += 1
     
+    # Single compressed archive of all quantized tensors, so downstream tools can
+    # read every layer with one np.load instead of parsing each COE file
+    bundle_filename = f"{output_dir}/fpga_weights_bundle.npz"
+    np.savez_compressed(bundle_filename, **weight_bundle)
+    
     # Create summary file
     summary_filename = f"{output_dir}/fpga_export_summary.txt"
-    with open(summary_filename, 'w') as f:
+    with open(summary_filename, 'w', buffering=EXPORT_BUFFER_SIZE, newline='\n', encoding='utf-8') as f:
         f.write(f"FPGA Weight Export Summary\n")
         f.write(f"========================\n\n")
         f.write(f"Quantization Format: {q_format}\n")
@@ -725,18 +679,20 @@ def export_to_FPGA(model, q_format="Q1.6"):
                 f.write(f"  - layer_{i}_{layer.name}_weights.coe\n")
                 if len(layer.get_weights()) > 1:
                     f.write(f"  - layer_{i}_{layer.name}_biases.coe\n")
+        f.write(f"  - {os.path.basename(bundle_filename)} (all quantized int8 tensors)\n")
     
     print(f"\nOK: FPGA export complete!")
     print(f"  - {layer_count} layers processed")
     print(f"  - {total_params} parameters exported")
     print(f"  - Files saved in: {output_dir}/")
     print(f"  - Summary: {summary_filename}")
+    print(f"  - Bundle: {bundle_filename}")
     # Emit a single VHDL package with all collected bias arrays
     if bias_collections:
         try:
             vhd_path = os.path.join('src', 'convolution_layer', 'bias_pkg.vhd')
             os.makedirs(os.path.dirname(vhd_path), exist_ok=True)
-            with open(vhd_path, 'w') as vhd:
+            with open(vhd_path, 'w', buffering=EXPORT_BUFFER_SIZE, newline='\n', encoding='utf-8') as vhd:
                 vhd.write("library IEEE;\n")
                 vhd.write("use IEEE.STD_LOGIC_1164.ALL;\n")
                 vhd.write("use IEEE.NUMERIC_STD.ALL;\n\n")
@@ -814,8 +770,8 @@ if __name__ == "__main__":
         test_quantized_model(quantized_model, x_test_quant, y_test_quant)
         apply_manual_quantization(model, x_test_quant, y_test_quant)
 
-        # Convert to ONNX
-        convert_to_onnx()
+        # Convert to ONNX (in-process, reusing the trained model)
+        convert_to_onnx(model)
 
         # Export weights and biases for FPGA
         export_to_FPGA(model)
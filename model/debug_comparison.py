@@ -5,64 +5,168 @@ Compares Python model outputs with VHDL simulation results
 """
 
 import argparse
-import csv
+import array
 import numpy as np
 import re
 import os
+import sys
+from itertools import islice
 from typing import List, Dict, Any, Optional
 
-def parse_sim_output_file(filename: str, bits: int = 16) -> List[Dict[str, Any]]:
+# Read buffer for sim logs (Vivado logs can be many MB)
+LOG_BUFFER_SIZE = 1 << 20
+
+# Sim log regexes (compiled once at import; the log is ASCII, so use ASCII-only classes)
+_SIM_OUT_RE = re.compile(r'^SIM_OUT\s+(.*)$', re.ASCII)
+# Position headers (final output and intermediate layers) in one pattern; the tag picks the layer type
+_HEADER_RE = re.compile(r'^(CNN_OUTPUT|MODULAR_OUTPUT|LAYER0_CONV1_OUTPUT|LAYER1_POOL1_OUTPUT|LAYER2_CONV2_OUTPUT):\s*\[(\d+),(\d+)\]', re.ASCII)
+_HEADER_LAYER_TYPES = {
+    'CNN_OUTPUT': 'final',
+    'MODULAR_OUTPUT': 'final',
+    'LAYER0_CONV1_OUTPUT': 'layer0',
+    'LAYER1_POOL1_OUTPUT': 'layer1',
+    'LAYER2_CONV2_OUTPUT': 'layer2',
+}
+# Python NPZ layer key -> VHDL layer type, used to filter outputs in compare_outputs
+_LAYER_TYPE_MAP = {
+    'layer_0_output': 'layer0',
+    'layer_1_output': 'layer1',
+    'layer_2_output': 'layer2',
+    # Pool2 (Python layer_3) is emitted as LAYER3_POOL2_OUTPUT in the TB
+    'layer_3_output': 'layer3',
+    'layer_4_output': 'flatten',
+    'layer_5_output': 'fc1',  # FC1 (Dense 64)
+    'layer_6_output': 'fc2',  # FC2 (Dense 10)
+    'cnn_output': 'final'
+}
+# FC output blocks: FC1 (dense 64 neurons) and FC2 (dense 10 classes), then their value lines
+_FC_RE = re.compile(r'^(FC1|FC2)_OUTPUT:\s*$', re.ASCII)
+_NEURON_RE = re.compile(r'^Neuron[_ ]?(\d+)\s*:\s*([0-9A-Fa-fx\-]+)', re.ASCII)
+_CLASS_RE = re.compile(r'^Class[_ ]?(\d+)\s*:\s*([0-9A-Fa-fx\-]+)', re.ASCII)
+# Filter lines, alternatives in priority order (each captures index, value):
+#   new TB format 'Filter_<i>_hex: 0x..' (hex preferred), then its 'dec: N' field,
+#   then the backwards-compatible 'Filter_<i>: v' and 'Filter <i> : v' forms
+_FILTER_RE = re.compile(
+    r'^Filter(?:[_ ]?(\d+)_hex:\s*(0x[0-9A-Fa-f]+)'
+    r'|[_ ]?(\d+)_hex:.*dec:\s*([0-9]+)'
+    r'|[_ ]?(\d+):\s*([0-9A-Fa-fx\-]+)'
+    r'|\s+(\d+)\s*:\s*([0-9A-Fa-fx\-]+))', re.ASCII)
+
+# Line dispatch on the first two characters of the stripped line: (kind, the one pattern to try).
+# Lines with any other prefix (Vivado banners, INFO/WARNING, ...) are skipped without a regex.
+# 'value' patterns capture (index, value) as the last two groups they close.
+_LINE_DISPATCH = {
+    'SI': ('sim_out', _SIM_OUT_RE),
+    'CN': ('header', _HEADER_RE),
+    'MO': ('header', _HEADER_RE),
+    'LA': ('header', _HEADER_RE),
+    'FC': ('fc', _FC_RE),
+    'Fi': ('value', _FILTER_RE),
+    'Ne': ('value', _NEURON_RE),
+    'Cl': ('value', _CLASS_RE),
+}
+
+# NPZ key pattern and parse_int helpers
+_LAYER_OUTPUT_KEY_RE = re.compile(r"layer_\d+_output")
+_LAYER_FILTER_KEY_RE = re.compile(r"layer_(\d+)_filter_(\d+)")
+_HEX_PREFIXES = ('0x', '0X', '-0x', '-0X')
+
+
+class _KeepIntChars(dict):
+    """str.translate table that keeps hex digits, '-' and 'x'/'X' and deletes everything else."""
+    def __missing__(self, key):
+        return None
+
+
+_INT_CHARS_TABLE = _KeepIntChars((ord(ch), ord(ch)) for ch in '0123456789abcdefABCDEF-xX')
+
+
+def parse_sim_output_file(filename: str, bits: int = 16, keep_raw: bool = False) -> List[Dict[str, Any]]:
     """
     Parse Vivado simulation log and accept either:
       - machine-friendly lines like: SIM_OUT layer=layer0 r=0 c=1 filter=0 raw=0xffea scale=4096
       - or the existing human lines: MODULAR_OUTPUT: [r,c] followed by lines 'Filter_n: value'
 
-    Returns a list of outputs: { 'row': int, 'col': int, 'filters': {idx: raw_int}, 'raw_lines': [...] }
+    Returns a list of outputs: { 'row': int, 'col': int, 'filters': {idx: raw_int} }.
+    With keep_raw=True each output also carries the matched log lines under 'raw_lines'.
     """
     outputs: List[Dict[str, Any]] = []
 
-    # regexes
-    sim_out_re = re.compile(r'^SIM_OUT\s+(.*)$')
-    keyval_re = re.compile(r'(\w+)=([^\s]+)')
-    modular_re = re.compile(r'^MODULAR_OUTPUT:\s*\[(\d+),(\d+)\]')
-    cnn_re = re.compile(r'^(?:CNN_OUTPUT|MODULAR_OUTPUT):\s*\[(\d+),(\d+)\]')
-    # NEW: Intermediate layer patterns
-    layer0_re = re.compile(r'^LAYER0_CONV1_OUTPUT:\s*\[(\d+),(\d+)\]')
-    layer1_re = re.compile(r'^LAYER1_POOL1_OUTPUT:\s*\[(\d+),(\d+)\]')
-    layer2_re = re.compile(r'^LAYER2_CONV2_OUTPUT:\s*\[(\d+),(\d+)\]')
-    # Generic pattern to catch other layer debug tags e.g. LAYER3_POOL2_OUTPUT
-    generic_layer_re = re.compile(r'^LAYER(\d+)[A-Z0-9_]*_OUTPUT:\s*\[(\d+),(\d+)\]')
-    filter_re1 = re.compile(r'^Filter[_ ]?(\d+):\s*([0-9A-Fa-fx\-]+)')
-    filter_re2 = re.compile(r'^Filter\s+(\d+)\s*:\s*([0-9A-Fa-fx\-]+)')
-    # FC output blocks
-    fc1_re = re.compile(r'^FC1_OUTPUT:\s*$')
-    fc2_re = re.compile(r'^FC2_OUTPUT:\s*$')
-    neuron_re = re.compile(r'^(?:Neuron[_ ]?(\d+)|\s+Neuron[_ ]?(\d+))\s*:\s*([0-9A-Fa-fx\-]+)')
-    class_re = re.compile(r'^(?:Class[_ ]?(\d+)|\s+Class[_ ]?(\d+))\s*:\s*([0-9A-Fa-fx\-]+)')
-    # New TB format: Filter_<i>_hex: 0x..  dec: N
-    filter_hex_re = re.compile(r'^Filter[_ ]?(\d+)_hex:\s*(0x[0-9A-Fa-f]+)')
-    filter_hex_dec_re = re.compile(r'^Filter[_ ]?(\d+)_hex:.*dec:\s*([0-9]+)')
+    # parse_int specialised on this parse's bit width: the sign constants are computed once
+    sign_bit = 1 << (bits - 1)
+    modulus = 1 << bits
+
+    def parse_value(s: str) -> int:
+        try:
+            val = int(s, 16) if s.startswith(_HEX_PREFIXES) else int(s)
+        except ValueError:
+            return parse_int(s, bits=bits)
+        return val - modulus if val >= sign_bit else val
 
     current = None
     try:
-        with open(filename, 'r') as f:
+        with open(filename, 'r', buffering=LOG_BUFFER_SIZE, encoding='utf-8', errors='replace') as f:
             for raw in f:
                 line = raw.strip()
-                if not line:
+                dispatch = _LINE_DISPATCH.get(line[:2])
+                if dispatch is None:
+                    continue
+                kind, pattern = dispatch
+                # FC blocks and filter/neuron/class lines only count once an output block has started
+                if current is None and kind in ('fc', 'value'):
                     continue
+                m = pattern.match(line)
+                if not m:
+                    continue
+
+                if kind == 'value':
+                    # Filter lines following a header, Neuron lines (FC1) or Class lines (FC2)
+                    idx = int(m.group(m.lastindex - 1))
+                    # Use provided bit-width for two's complement interpretation
+                    current['filters'][idx] = parse_value(m.group(m.lastindex))
+                    if keep_raw:
+                        current['raw_lines'].append(line)
+
+                elif kind == 'header':
+                    # Human-readable MODULAR_OUTPUT or CNN_OUTPUT or intermediate layers
+                    layer_type = _HEADER_LAYER_TYPES[m.group(1)]
+                    r, c = int(m.group(2)), int(m.group(3))
+                    current = {'row': r, 'col': c, 'filters': {}, 'layer': layer_type}
+                    if keep_raw:
+                        current['raw_lines'] = [line]
+                    outputs.append(current)
+
+                elif kind == 'fc':
+                    # Start an FC1 / FC2 human-readable block
+                    current = {'row': None, 'col': None, 'filters': {}, 'layer': m.group(1).lower()}
+                    if keep_raw:
+                        current['raw_lines'] = [line]
+                    outputs.append(current)
 
-                # Machine-friendly SIM_OUT
-                m = sim_out_re.match(line)
-                if m:
-                    kvs = dict(keyval_re.findall(m.group(1)))
+                else:
+                    # Machine-friendly SIM_OUT: whitespace separated key=value tokens
+                    kvs = {}
+                    for tok in m.group(1).split():
+                        k, _, v = tok.partition('=')
+                        if k and v:
+                            kvs[k] = v
                     try:
-                        r = int(kvs.get('r', kvs.get('row', 0)))
-                        c = int(kvs.get('c', kvs.get('col', 0)))
+                        # 'r'/'c' is the common spelling; only fall back to 'row'/'col' (default 0) on a miss
+                        try:
+                            r = int(kvs['r'])
+                        except KeyError:
+                            r = int(kvs.get('row', 0))
+                        try:
+                            c = int(kvs['c'])
+                        except KeyError:
+                            c = int(kvs.get('col', 0))
                     except ValueError:
                         # ignore malformed
                         continue
 
-                    entry = {'row': r, 'col': c, 'filters': {}, 'raw_lines': [line]}
+                    entry = {'row': r, 'col': c, 'filters': {}}
+                    if keep_raw:
+                        entry['raw_lines'] = [line]
                     # if filter provided as filter=idx:value pairs
                     if 'filter' in kvs and ':' in kvs['filter']:
                         fparts = kvs['filter'].split(':')
@@ -74,94 +178,6 @@ def parse_sim_output_file(filename: str, bits: int = 16) -> List[Dict[str, Any]]
 
                     outputs.append(entry)
                     current = entry
-                    continue
-
-                # Human-readable MODULAR_OUTPUT or CNN_OUTPUT or intermediate layers
-                layer_type = None
-                m2 = cnn_re.match(line)
-                if m2:
-                    layer_type = 'final'
-                if not m2:
-                    m2 = layer0_re.match(line)
-                    if m2:
-                        layer_type = 'layer0'
-                if not m2:
-                    m2 = layer1_re.match(line)
-                    if m2:
-                        layer_type = 'layer1'
-                if not m2:
-                    m2 = layer2_re.match(line)
-                    if m2:
-                        layer_type = 'layer2'
-                if m2:
-                    r, c = int(m2.group(1)), int(m2.group(2))
-                    current = {'row': r, 'col': c, 'filters': {}, 'layer': layer_type, 'raw_lines': [line]}
-                    outputs.append(current)
-                    continue
-
-                # Filter lines following MODULAR_OUTPUT (support multiple formats)
-                if current is not None:
-                    # New hex format: prefer hex parsing (8-bit values)
-                    m_hex = filter_hex_re.match(line)
-                    if m_hex:
-                        idx = int(m_hex.group(1))
-                        hex_str = m_hex.group(2)
-                        # Interpret as 8-bit two's complement
-                        # Use provided bit-width for two's complement interpretation
-                        current['filters'][idx] = parse_int(hex_str, bits=bits)
-                        current['raw_lines'].append(line)
-                        continue
-
-                    # If line contains hex but also 'dec: N', prefer hex; fallback to dec if needed
-                    m_hexdec = filter_hex_dec_re.match(line)
-                    if m_hexdec:
-                        idx = int(m_hexdec.group(1))
-                        dec_str = m_hexdec.group(2)
-                        # dec in TB is unsigned decimal; convert to signed 8-bit
-                        current['filters'][idx] = parse_int(dec_str, bits=bits)
-                        current['raw_lines'].append(line)
-                        continue
-
-                    # Backwards-compatible formats
-                    m3 = filter_re1.match(line) or filter_re2.match(line)
-                    if m3:
-                        idx = int(m3.group(1))
-                        raw_str = m3.group(2)
-                        current['filters'][idx] = parse_int(raw_str, bits=bits)
-                        current['raw_lines'].append(line)
-                        continue
-
-                    # FC1 / FC2 human-readable blocks
-                    m_fc1 = fc1_re.match(line)
-                    if m_fc1:
-                        # Start an FC1 block (dense 64 neurons)
-                        current = {'row': None, 'col': None, 'filters': {}, 'layer': 'fc1', 'raw_lines': [line]}
-                        outputs.append(current)
-                        continue
-                    m_fc2 = fc2_re.match(line)
-                    if m_fc2:
-                        # Start an FC2 block (dense 10 classes)
-                        current = {'row': None, 'col': None, 'filters': {}, 'layer': 'fc2', 'raw_lines': [line]}
-                        outputs.append(current)
-                        continue
-
-                    # Neuron lines (for FC1)
-                    m_neuron = neuron_re.match(line)
-                    if m_neuron:
-                        idx = int(m_neuron.group(1) or m_neuron.group(2))
-                        val = m_neuron.group(3)
-                        current['filters'][idx] = parse_int(val, bits=bits)
-                        current['raw_lines'].append(line)
-                        continue
-
-                    # Class lines (for FC2)
-                    m_class = class_re.match(line)
-                    if m_class:
-                        idx = int(m_class.group(1) or m_class.group(2))
-                        val = m_class.group(3)
-                        current['filters'][idx] = parse_int(val, bits=bits)
-                        current['raw_lines'].append(line)
-                        continue
 
     except FileNotFoundError:
         print(f"Vivado log file {filename} not found.")
@@ -169,11 +185,11 @@ def parse_sim_output_file(filename: str, bits: int = 16) -> List[Dict[str, Any]]
 
     return outputs
 
-def parse_vivado_log_file(filename: str, bits: int = 16) -> Dict[str, Any]:
+def parse_vivado_log_file(filename: str, bits: int = 16, keep_raw: bool = False) -> Dict[str, Any]:
     """
     Backwards-compatible parser wrapper. Returns dict with 'inputs' and 'outputs'.
     """
-    outputs = parse_sim_output_file(filename, bits=bits)
+    outputs = parse_sim_output_file(filename, bits=bits, keep_raw=keep_raw)
     return {'inputs': [], 'outputs': outputs}
 
 def load_python_data(filename: str = "model/intermediate_values.npz"):
@@ -254,19 +270,15 @@ def generate_intermediate_from_test_image(test_image_npz: str, out_npz: str = "m
                 for i, out in enumerate(preds):
                     # out is batched; drop batch dimension
                     arr = out[0]
+                    # Per-filter maps are not stored; pick_python_layer slices them from this array
                     intermediate_data[f"layer_{i}_output"] = arr
 
-                    # For Conv2D layers, also expose per-filter 2D maps similar to CNN.py
-                    if arr.ndim == 3:
-                        for fidx in range(arr.shape[-1]):
-                            intermediate_data[f"layer_{i}_filter_{fidx}"] = arr[:, :, fidx]
-
                 # Also record the input image
                 intermediate_data['input_image'] = image.astype(np.uint8)
 
                 # Save and return
                 os.makedirs(os.path.dirname(out_npz), exist_ok=True)
-                np.savez(out_npz, **intermediate_data)
+                np.savez_compressed(out_npz, **intermediate_data)
                 print(f"✓ Captured and saved intermediate values to: {out_npz}")
                 return np.load(out_npz)
             except Exception as e:
@@ -296,7 +308,7 @@ def generate_intermediate_from_test_image(test_image_npz: str, out_npz: str = "m
 
     # Save to NPZ
     os.makedirs(os.path.dirname(out_npz), exist_ok=True)
-    np.savez(out_npz, **intermediate_data)
+    np.savez_compressed(out_npz, **intermediate_data)
     print(f"✓ Generated placeholder intermediate values at: {out_npz}")
     return np.load(out_npz)
 
@@ -320,13 +332,20 @@ def pick_python_layer(npz_archive: np.lib.npyio.NpzFile, layer_name: Optional[st
         alt = f"layer_{layer_name}_output"
         if alt in npz_archive:
             return npz_archive[alt], alt
+        # per-filter map like 'layer_0_filter_3' -> layer_0_output[:, :, 3]
+        m = _LAYER_FILTER_KEY_RE.fullmatch(layer_name)
+        if m and f"layer_{m.group(1)}_output" in npz_archive:
+            arr = npz_archive[f"layer_{m.group(1)}_output"]
+            fidx = int(m.group(2))
+            if arr.ndim == 3 and fidx < arr.shape[-1]:
+                return arr[:, :, fidx], layer_name
         print(f"Requested layer '{layer_name}' not found. Available keys: {keys}")
         return None, None
 
     # No layer requested: find the first multi-dimensional array suitable for conv/pool
     # Prefer 'layer_#_output' patterns
     for k in keys:
-        if re.match(r"layer_\d+_output", k):
+        if _LAYER_OUTPUT_KEY_RE.match(k):
             return npz_archive[k], k
 
     # Fallback: return the first array
@@ -346,22 +365,26 @@ def parse_int(s: str, bits: Optional[int] = 16) -> int:
     """
     s = s.strip()
     try:
-        if s.lower().startswith('0x'):
+        # Fast paths for the two formats the TB emits: 0x-prefixed hex and signed decimal
+        if s.startswith(_HEX_PREFIXES):
             val = int(s, 16)
         else:
-            val = int(s, 0)
+            val = int(s)
     except ValueError:
-        # fallback: strip non-digits
-        digits = re.sub(r'[^0-9a-fA-F\-xX]', '', s)
-        if digits.lower().startswith('0x'):
-            val = int(digits, 16)
-        else:
-            val = int(digits)
+        try:
+            # other prefixed literals (0b.., 0o..) via int's own base detection
+            val = int(s, 0)
+        except ValueError:
+            # fallback: strip non-digits
+            digits = s.translate(_INT_CHARS_TABLE)
+            if digits.lower().startswith('0x'):
+                val = int(digits, 16)
+            else:
+                val = int(digits)
 
     # convert from unsigned representation to signed
-    if val >= (1 << (bits-1)):
-        val = val - (1 << bits)
-    return val
+    mask = 1 << bits
+    return val - mask if val >= (mask >> 1) else val
 
 def fixed_to_float(vhdl_value: int, scale_factor: int = 4096, bits: int = 16) -> float:
     """Convert a signed fixed integer (two's complement) to float by scale factor.
@@ -373,6 +396,12 @@ def fixed_to_float(vhdl_value: int, scale_factor: int = 4096, bits: int = 16) ->
         v = vhdl_value
     return v / float(scale_factor)
 
+def fixed_to_float_array(raws: np.ndarray, scale_factor=4096, bits: int = 16) -> np.ndarray:
+    """Array form of fixed_to_float: same two's complement guard and scaling on a whole int array.
+    scale_factor may be a scalar or an array that broadcasts against raws."""
+    signed = np.where(raws >= (1 << (bits - 1)), raws - (1 << bits), raws)
+    return signed / np.asarray(scale_factor, dtype=np.float64)
+
 def find_best_scale_factor(python_data, vhdl_outputs):
     """Find the best scale factor by trying different values."""
     if not vhdl_outputs or python_data is None:
@@ -385,26 +414,20 @@ def find_best_scale_factor(python_data, vhdl_outputs):
     print("\n=== Finding Best Scale Factor ===")
     
     # Test with first few outputs
-    test_outputs = vhdl_outputs[:3]
+    rows, cols, filters, raws = _flatten_outputs(vhdl_outputs[:3])
+    # Keep only entries inside the Python array (one mask instead of per-entry checks)
+    height, width, channels = python_data.shape[:3]
+    valid = ((rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+             & (filters >= 0) & (filters < channels))
     
-    for scale in scale_factors:
-        total_error = 0
-        count = 0
+    if valid.any():
+        python_vals = python_data[rows[valid], cols[valid], filters[valid]].astype(np.float64)
+        # One (num_scales, num_entries) broadcast covers every candidate scale
+        scales = np.asarray(scale_factors, dtype=np.float64)
+        vhdl_relu = np.maximum(fixed_to_float_array(raws[valid][None, :], scales[:, None]), 0.0)
+        avg_errors = np.abs(python_vals[None, :] - vhdl_relu).mean(axis=1)
         
-        for output in test_outputs:
-            row, col = output['row'], output['col']
-            if row < python_data.shape[0] and col < python_data.shape[1]:
-                for filter_idx, vhdl_raw in output['filters'].items():
-                    if filter_idx < python_data.shape[2]:
-                        python_val = python_data[row, col, filter_idx]
-                        vhdl_float = fixed_to_float(vhdl_raw, scale)
-                        vhdl_relu = max(0.0, vhdl_float)
-                        error = abs(python_val - vhdl_relu)
-                        total_error += error
-                        count += 1
-        
-        if count > 0:
-            avg_error = total_error / count
+        for scale, avg_error in zip(scale_factors, avg_errors.tolist()):
             print(f"Scale {scale:5d}: Average error = {avg_error:.6f}")
             if avg_error < best_error:
                 best_error = avg_error
@@ -425,6 +448,46 @@ def analyze_scaling(output_scale_factor=64):
         print(f"Outputs expected as {output_scale_factor}-scale signed integers (bits vary).")
     print("(Use --vhdl_scale and --vhdl_bits to adjust parser expectations.)")
 
+def _flatten_outputs(vhdl_outputs: List[Dict[str, Any]]):
+    """Flatten parsed VHDL outputs into parallel int64 arrays (rows, cols, filters, raws).
+
+    One element per (output, filter) pair, in parse order. FC blocks have no
+    position, so their row/col are stored as -1.
+    """
+    # Native 8-byte columns instead of lists of boxed ints; NumPy views them without a copy
+    rows = array.array('q')
+    cols = array.array('q')
+    filters = array.array('q')
+    raws = array.array('q')
+    for output in vhdl_outputs:
+        fmap = output['filters']
+        n = len(fmap)
+        row, col = output['row'], output['col']
+        rows.extend([-1 if row is None else row] * n)
+        cols.extend([-1 if col is None else col] * n)
+        filters.extend(fmap.keys())
+        raws.extend(fmap.values())
+    return tuple(np.frombuffer(column, dtype=np.int64) for column in (rows, cols, filters, raws))
+
+def _gather_python_values(pyarr, rows, cols, filters):
+    """Gather the Python value for every flattened VHDL entry (float64, 0.0 where undefined)."""
+    vals = np.zeros(filters.shape, dtype=np.float64)
+    # If 1D (FC/dense layer): ignore r,c, use filter_idx as neuron index
+    if pyarr.ndim == 1:
+        ok = (filters >= 0) & (filters < pyarr.shape[0])
+        vals[ok] = pyarr[filters[ok]]
+    # If 3D (H,W,C)
+    elif pyarr.ndim == 3:
+        vals[:] = pyarr[rows, cols, filters]
+    # If 2D (H,W): only valid when comparing a single-channel output (filter 0)
+    elif pyarr.ndim == 2:
+        ok = filters == 0
+        vals[ok] = pyarr[rows[ok], cols[ok]]
+    # If 4D (batch,H,W,C) choose first batch element
+    elif pyarr.ndim == 4:
+        vals[:] = pyarr[0, rows, cols, filters]
+    return vals
+
 def compare_outputs(python_data, vhdl_outputs, output_scale_factor=64, vhdl_bits=8, layer_key=None, vhdl_layer=None, display_limit: int = 80):
     """Compare Python and VHDL outputs at all positions.
 
@@ -446,24 +509,12 @@ def compare_outputs(python_data, vhdl_outputs, output_scale_factor=64, vhdl_bits
     is_fc_layer = (py.ndim == 1)
     
     # Filter VHDL outputs either by provided explicit vhdl_layer or inferred from python layer_key
-    layer_type_map = {
-        'layer_0_output': 'layer0',
-        'layer_1_output': 'layer1',
-        'layer_2_output': 'layer2',
-        # Pool2 (Python layer_3) is emitted as LAYER3_POOL2_OUTPUT in the TB
-        'layer_3_output': 'layer3',
-        'layer_4_output': 'flatten',
-        'layer_5_output': 'fc1',  # FC1 (Dense 64)
-        'layer_6_output': 'fc2',  # FC2 (Dense 10)
-        'cnn_output': 'final'
-    }
-
     if vhdl_layer:
         filtered_outputs = [o for o in vhdl_outputs if o.get('layer') == vhdl_layer]
         print(f"🔍 Filtering VHDL outputs for explicit vhdl_layer='{vhdl_layer}': {len(vhdl_outputs)} → {len(filtered_outputs)} outputs")
         vhdl_outputs = filtered_outputs
-    elif layer_key and layer_key in layer_type_map:
-        expected_layer_type = layer_type_map[layer_key]
+    elif layer_key and layer_key in _LAYER_TYPE_MAP:
+        expected_layer_type = _LAYER_TYPE_MAP[layer_key]
         filtered_outputs = [o for o in vhdl_outputs if o.get('layer') == expected_layer_type]
         print(f"🔍 Filtering for layer '{layer_key}' (type='{expected_layer_type}'): {len(vhdl_outputs)} → {len(filtered_outputs)} outputs")
         vhdl_outputs = filtered_outputs
@@ -486,33 +537,31 @@ def compare_outputs(python_data, vhdl_outputs, output_scale_factor=64, vhdl_bits
         format_desc = f"{vhdl_bits}-bit signed (scale = {output_scale_factor})"
     print(f"Output format: {format_desc}")
 
-    total_error = 0.0
-    total_abs_error = 0.0
-    valid_comparisons = 0
-    max_error = 0.0
-    max_error_pos = None
-    filter_errors = {}
-
-    # Helper to index Python data depending on its dimensionality
-    def get_python_value(pyarr, r, c, fidx):
-        # If 1D (FC/dense layer): ignore r,c, use filter_idx as neuron index
-        if pyarr.ndim == 1:
-            if 0 <= fidx < pyarr.shape[0]:
-                return float(pyarr[fidx])
-            return 0.0
-        # If 3D (H,W,C)
-        if pyarr.ndim == 3:
-            return float(pyarr[r, c, fidx])
-        # If 2D (H,W) and fidx==0
-        if pyarr.ndim == 2:
-            # Only valid when comparing a single-channel output
-            if fidx == 0:
-                return float(pyarr[r, c])
-            return 0.0
-        # If 4D (batch,H,W,C) choose first batch element
-        if pyarr.ndim == 4:
-            return float(pyarr[0, r, c, fidx])
-        return 0.0
+    # Flatten every (output, filter) pair once and work on whole arrays from here on
+    rows, cols, filters, raws = _flatten_outputs(vhdl_outputs)
+
+    # Skip entries outside python shape: one mask over all entries instead of per-entry checks
+    if py.ndim == 1:
+        valid = filters < py.shape[0]
+    elif py.ndim >= 2:
+        # Spatial axes are (H, W), or (batch, H, W, C) with the first batch element
+        height, width = py.shape[1:3] if py.ndim == 4 else py.shape[:2]
+        valid = (rows >= 0) & (rows < height) & (cols >= 0) & (cols < width)
+        if py.ndim >= 3:
+            valid &= (filters >= 0) & (filters < py.shape[-1])
+    else:
+        valid = np.ones(filters.shape, dtype=bool)
+    # The display covers the filters of the first display_limit outputs, capped at display_limit rows
+    display_limit = max(display_limit, 0)
+    head_end = sum(len(o['filters']) for o in islice(vhdl_outputs, display_limit))
+    display_count = min(display_limit, int(np.count_nonzero(valid[:head_end])))
+    rows, cols, filters, raws = rows[valid], cols[valid], filters[valid], raws[valid]
+
+    python_vals = _gather_python_values(py, rows, cols, filters)
+    # Same conversion + ReLU as fixed_to_float / max(0.0, x), on the whole array
+    vhdl_relu = np.maximum(fixed_to_float_array(raws, output_scale_factor, bits=vhdl_bits), 0.0)
+    errors = np.abs(python_vals - vhdl_relu)
+    valid_comparisons = errors.size
 
     # Display header
     if is_fc_layer:
@@ -522,61 +571,39 @@ def compare_outputs(python_data, vhdl_outputs, output_scale_factor=64, vhdl_bits
         print("\nPosition | Filter | Python   | VHDL(float) | VHDL(raw) | Error    | Rel.Err")
         print("---------|--------|----------|-------------|-----------|----------|--------")
 
-    # Show first N positions for quick debugging (non-mutating display)
-    display_count = 0
-    for output in vhdl_outputs[:display_limit]:
-        row, col = output['row'], output['col']
-        for filter_idx, vhdl_raw in output['filters'].items():
-            # Skip filters outside python shape
-            if py.ndim == 1 and filter_idx >= py.shape[0]:
-                continue
-            if py.ndim >= 3 and filter_idx >= py.shape[2]:
-                continue
-            python_val = get_python_value(py, row, col, filter_idx)
-            vhdl_float = fixed_to_float(vhdl_raw, scale_factor=output_scale_factor, bits=vhdl_bits)
-            vhdl_relu = max(0.0, vhdl_float)
-            error = abs(python_val - vhdl_relu)
-            rel_error = (error / max(abs(python_val), 0.001)) * 100
-
-            if display_count < display_limit:
-                if is_fc_layer:
-                    print(f"   {filter_idx:3d}   | {python_val:8.5f} | {vhdl_relu:11.5f} | {vhdl_raw:9d} | {error:8.5f} | {rel_error:6.1f}%")
-                else:
-                    print(f"[{row:2d},{col:2d}] |   {filter_idx}    | {python_val:8.5f} | {vhdl_relu:11.5f} | {vhdl_raw:9d} | {error:8.5f} | {rel_error:6.1f}%")
-                display_count += 1
-
-    # Now compute aggregate statistics across all reported VHDL outputs
-    for output in vhdl_outputs:
-        row, col = output['row'], output['col']
-        for filter_idx, vhdl_raw in output['filters'].items():
-            if py.ndim == 1 and filter_idx >= py.shape[0]:
-                continue
-            if py.ndim >= 3 and filter_idx >= py.shape[2]:
-                continue
-            python_val = get_python_value(py, row, col, filter_idx)
-            vhdl_float = fixed_to_float(vhdl_raw, scale_factor=output_scale_factor, bits=vhdl_bits)
-            vhdl_relu = max(0.0, vhdl_float)
-            error = abs(python_val - vhdl_relu)
-
-            # We already counted the first displayed comparisons; continue counting all
-            total_error += error
-            total_abs_error += abs(error)
-            valid_comparisons += 1
-
-            if error > max_error:
-                max_error = error
-                max_error_pos = (row, col, filter_idx)
-
-            if filter_idx not in filter_errors:
-                filter_errors[filter_idx] = {'count': 0, 'total_error': 0.0, 'zero_count': 0}
-            filter_errors[filter_idx]['count'] += 1
-            filter_errors[filter_idx]['total_error'] += error
-            if vhdl_raw == 0:
-                filter_errors[filter_idx]['zero_count'] += 1
+    # Show first N positions for quick debugging (rows are collected and written in one call)
+    head = slice(0, display_count)
+    rel_errors = errors[head] / np.maximum(np.abs(python_vals[head]), 0.001) * 100
+    lines = []
+    for row, col, filter_idx, python_val, vhdl_val, vhdl_raw, error, rel_error in zip(
+            rows[head].tolist(), cols[head].tolist(), filters[head].tolist(), python_vals[head].tolist(),
+            vhdl_relu[head].tolist(), raws[head].tolist(), errors[head].tolist(), rel_errors.tolist()):
+        if is_fc_layer:
+            lines.append(f"   {filter_idx:3d}   | {python_val:8.5f} | {vhdl_val:11.5f} | {vhdl_raw:9d} | {error:8.5f} | {rel_error:6.1f}%\n")
+        else:
+            lines.append(f"[{row:2d},{col:2d}] |   {filter_idx}    | {python_val:8.5f} | {vhdl_val:11.5f} | {vhdl_raw:9d} | {error:8.5f} | {rel_error:6.1f}%\n")
+    sys.stdout.write("".join(lines))
 
     if valid_comparisons > 0:
+        total_error = float(errors.sum())
         avg_error = total_error / valid_comparisons
-        avg_abs_error = total_abs_error / valid_comparisons
+        # Errors are non-negative, so the absolute average is the same sum
+        avg_abs_error = avg_error
+
+        # First occurrence of the largest error; no position when every error is zero
+        max_idx = int(np.argmax(errors))
+        max_error = float(errors[max_idx])
+        max_error_pos = None
+        if max_error > 0.0:
+            row, col = int(rows[max_idx]), int(cols[max_idx])
+            max_error_pos = (None if row < 0 else row, None if col < 0 else col, int(filters[max_idx]))
+
+        # Per-filter statistics: one bincount per column over the sorted filter ids
+        filter_ids, filter_slot = np.unique(filters, return_inverse=True)
+        filter_slot = filter_slot.ravel()
+        filter_counts = np.bincount(filter_slot, minlength=filter_ids.size)
+        filter_totals = np.bincount(filter_slot, weights=errors, minlength=filter_ids.size)
+        filter_zeros = np.bincount(filter_slot[raws == 0], minlength=filter_ids.size)
 
         print(f"\n{'='*70}")
         print(f"OVERALL STATISTICS ({valid_comparisons} comparisons)")
@@ -593,11 +620,13 @@ def compare_outputs(python_data, vhdl_outputs, output_scale_factor=64, vhdl_bits
             print(f"Per-Filter Analysis:")
             print(f"Filter | Avg Error | Zero Count | Total Samples")
             print(f"-------|-----------|------------|---------------")
-        for filt_idx in sorted(filter_errors.keys()):
-            stats = filter_errors[filt_idx]
-            avg_f_error = stats['total_error'] / stats['count'] if stats['count'] > 0 else 0
-            zero_pct = (stats['zero_count'] / stats['count'] * 100) if stats['count'] > 0 else 0
-            print(f"  {filt_idx:3d}  | {avg_f_error:9.6f} | {stats['zero_count']:4d}/{stats['count']:4d} | {zero_pct:5.1f}% zeros")
+        lines = []
+        for filt_idx, total_f_error, zero_count, count in zip(
+                filter_ids.tolist(), filter_totals.tolist(), filter_zeros.tolist(), filter_counts.tolist()):
+            avg_f_error = total_f_error / count
+            zero_pct = zero_count / count * 100
+            lines.append(f"  {filt_idx:3d}  | {avg_f_error:9.6f} | {zero_count:4d}/{count:4d} | {zero_pct:5.1f}% zeros\n")
+        sys.stdout.write("".join(lines))
 
         print(f"\nQuantization Summary:")
         print(f"  - Weights: Q1.6 format (8-bit signed, scale = 64)")
@@ -729,7 +758,7 @@ def main():
         print(f"Configuration: VHDL scale={args.vhdl_scale}, bits={args.vhdl_bits}")
         print("  Expected: --vhdl_scale 64 --vhdl_bits 8 for Q1.6 format")
     
-    # End: no troubleshooting noise by default. The user can inspect per-filter stats and raw_lines in output files.
+    # End: no troubleshooting noise by default. The user can inspect per-filter stats in output files.
     # Additionally, attempt to validate FC2 (final classification) if present in the VHDL debug output
     try:
         fc2_match = validate_fc2_argmax(npz_archive, vhdl_outputs, vhdl_bits=args.vhdl_bits, scale=args.vhdl_scale)
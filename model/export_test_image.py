@@ -88,19 +88,11 @@ def export_vhdl_package(image, output_path="src/test_images/test_image_pkg.vhd",
         f.write("    type test_image_array_t is array (0 to 27, 0 to 27) of integer range 0 to 255;\n\n")
         
         # Image data constant
+        # Build the whole aggregate literal first and write it in one call
+        rows = ["        (" + ", ".join(f"{val:3d}" for val in row) + ")"
+                for row in image[:28, :28].tolist()]
         f.write("    constant TEST_IMAGE_DATA : test_image_array_t := (\n")
-        for row in range(28):
-            f.write("        (")
-            for col in range(28):
-                val = int(image[row, col])
-                if col < 27:
-                    f.write(f"{val:3d}, ")
-                else:
-                    f.write(f"{val:3d}")
-            if row < 27:
-                f.write("),\n")
-            else:
-                f.write(")\n")
+        f.write(",\n".join(rows) + "\n")
         f.write("    );\n\n")
         
         f.write("end package test_image_pkg;\n\n")
@@ -121,10 +113,10 @@ def export_npz_reference(image, category, category_idx, output_path="model/test_
     """
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
-    np.savez(output_path,
-             image=image,
-             category=category,
-             category_idx=category_idx)
+    np.savez_compressed(output_path,
+                        image=image,
+                        category=category,
+                        category_idx=category_idx)
     
     print(f"✓ Reference NPZ saved to: {output_path}")
 
@@ -137,14 +129,10 @@ def export_bytes_txt(image, output_path="model/test_image_bytes.txt"):
     """
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
 
+    lines = ["Write(8, [" + ", ".join(f"0x{val:02X}" for val in row) + "]);\n"
+             for row in image.tolist()]
     with open(output_path, 'w') as f:
-        for row in range(image.shape[0]):
-            cols = []
-            for col in range(image.shape[1]):
-                val = int(image[row, col])
-                cols.append(f"0x{val:02X}")
-            line = "Write(8, [" + ", ".join(cols) + "]);\n"
-            f.write(line)
+        f.write("".join(lines))
 
     print(f"✓ Bytes text exported to: {output_path}")
 